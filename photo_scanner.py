@@ -1,25 +1,159 @@
 import os
-from pathlib import Path
+import numpy as np
 import pandas as pd
 from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 from urllib.parse import quote
 import json
+import sqlite3
+import numbers
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+import itertools
 import math
 
+# Offline reverse geocoding is optional
+try:
+    import reverse_geocoder
+except ImportError:
+    reverse_geocoder = None
+
+# Faster JSON parser is optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Progress bar is optional
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+# Writing CSV files with pyarrow is optional
+try:
+    import pyarrow
+    import pyarrow.csv
+except ImportError:
+    pyarrow = None
+
+# Reverse geocoding service: 'nominatim' (online, detailed addresses, 1 request per second),
+# 'azure' (Azure Maps batch requests of up to 100 coordinates, requires AZURE_MAPS_KEY) or
+# 'offline' (reverse_geocoder package, nearest GeoNames city, no requests, country as ISO code)
+GEOCODER = 'nominatim'
+
+# Azure Maps reverse geocoding batch endpoint and subscription key
+AZURE_MAPS_URL = "https://atlas.microsoft.com/reverseGeocode:batch?api-version=2023-06-01"
+AZURE_MAPS_KEY = ''
+
+# Maximum number of coordinates in one Azure Maps batch request
+AZURE_BATCH_SIZE = 100
+
+# Nominatim API reverse geocoding endpoint
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+
+# User-Agent for API requests (Nominatim API requirement)
+USER_AGENT = 'CityPin/1.0 (https://github.com/yourusername/citypin)'
+
+# Minimum interval between starting two requests, in seconds (public Nominatim allows 1 request per second,
+# set to 0 for a self-hosted Nominatim server without limits)
+REQUEST_INTERVAL = 1.0
+
+# Maximum number of requests in progress at the same time (can be raised for a self-hosted server)
+MAX_CONCURRENT_REQUESTS = 4
+
+# Number of coordinates sent in one batch request (keeps request URL under ~2000 characters)
+BATCH_SIZE = 30
+
+# Whether Nominatim server accepts batch requests (reset on first rejected batch request)
+nominatim_batch_supported = True
+
+# Time of the previous request to Nominatim API (time.monotonic()) and lock for pacing requests from threads
+last_request_time = None
+request_lock = threading.Lock()
+
+# Number of processed items between progress messages (when tqdm is not installed)
+PROGRESS_INTERVAL = 100
+
+# Number of threads reading photos in parallel
+MAX_SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Maximum number of photos queued for reading at once (limits memory used for pending results)
+MAX_PENDING_SCANS = MAX_SCAN_WORKERS * 4
+
+# Supported image formats (file extensions in lower case)
+SUPPORTED_FORMATS = frozenset({'.jpg', '.jpeg', '.tif', '.tiff', '.png'})
+
+# File signatures of supported image formats
+JPEG_SIGNATURE = b'\xff\xd8\xff'
+PNG_SIGNATURE = b'\x89PNG'
+TIFF_SIGNATURES = (b'II*\x00', b'MM\x00*')
+
+# Degrees, minutes and seconds of photo without coordinates
+MISSING_DMS = (np.nan, np.nan, np.nan)
+
+# Compression of Parquet files
+PARQUET_COMPRESSION = 'zstd'
+
+# Columns of scan cache: photo data and size and modification time of file
+SCAN_CACHE_COLUMNS = ['file_path', 'date_taken', 'latitude', 'longitude', 'mtime_ns', 'size']
+
+# Decimal places of coordinates grouped as one place (2 is about 1 km, enough for city level)
+LOCATION_KEY_PRECISION = 2
+
+# HTTP session reusing connections to Nominatim API between requests,
+# temporary errors (rate limit, server overload) are retried with increasing pauses
+session = requests.Session()
+session.headers.update({'User-Agent': USER_AGENT})
+http_adapter = HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=MAX_CONCURRENT_REQUESTS,
+    max_retries=Retry(total=3, backoff_factor=1.0, status_forcelist=[429, 502, 503, 504], raise_on_status=False)
+)
+session.mount('https://', http_adapter)
+session.mount('http://', http_adapter)
+
+# Address fields of Nominatim API response with city and region, in order of preference
+CITY_KEYS = ('city', 'town', 'village', 'hamlet', 'municipality')
+STATE_KEYS = ('state', 'region', 'province', 'county')
+
+# Columns with location information added to photo data
+LOCATION_COLUMNS = ['city', 'state', 'country', 'display_name']
+
+# Maximum difference of coordinates (in degrees) considered the same place, about 1 km at the equator
+PROXIMITY_THRESHOLD = 0.01
+
 # Global dictionary for caching coordinate query results
 location_cache = {}
 
-# Function to load cache from file
+# Cache database (SQLite) next to the program and JSON cache file of previous versions
+CACHE_DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'location_cache.db')
+LEGACY_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'location_cache.json')
+
+# Number of new cache entries after which they are written to database
+CACHE_SAVE_INTERVAL = 100
+
+# Connection to cache database (opened when cache is loaded)
+cache_db = None
+
+# Keys of cache entries added during this run and not yet saved to database
+unsaved_cache_keys = []
+
+# Index of cached coordinates by grid cell of PROXIMITY_THRESHOLD size:
+# (cell_lat, cell_lon) -> list of (latitude, longitude, cache key)
+location_cache_index = {}
+
+# Function to load cache from old JSON file
 def load_cache_from_file(photos_directory=None):
-    """Loads coordinate cache from file"""
-    cache_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'location_cache.json')
-    
-    if os.path.exists(cache_file):
+    """Loads coordinate cache from JSON file used by previous versions"""
+    if os.path.exists(LEGACY_CACHE_FILE):
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
+            with open(LEGACY_CACHE_FILE, 'r', encoding='utf-8') as f:
                 # Load cache from file
                 cache_data = json.load(f)
                 # Convert keys back to strings (they were saved as strings)
@@ -28,26 +162,138 @@ def load_cache_from_file(photos_directory=None):
             print(f"Error loading cache from file: {e}")
     return {}
 
-# Function to save cache to file
-def save_cache_to_file(cache, photos_directory=None):
-    """Saves coordinate cache to file"""
-    cache_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'location_cache.json')
+# Function to open cache database
+def open_cache_db():
+    """Opens SQLite database with coordinate cache, creates cache table if needed"""
+    connection = sqlite3.connect(CACHE_DB_FILE)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    # Coordinates are stored as integers (degrees * 10^6), matching 6 decimal places of cache keys
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS loc (
+            lat INTEGER,
+            lon INTEGER,
+            city TEXT,
+            state TEXT,
+            country TEXT,
+            display_name TEXT,
+            PRIMARY KEY (lat, lon)
+        )""")
+    return connection
+
+# Function to convert cache entry to database row
+def cache_entry_to_row(key, location_info):
+    """Converts cache key and location information to database row, returns None for invalid keys"""
+    cached_coords = parse_cache_key(key)
+    if cached_coords is None:
+        return None
+    return (round(cached_coords[0] * 1e6), round(cached_coords[1] * 1e6),
+            location_info.get('city'), location_info.get('state'),
+            location_info.get('country'), location_info.get('display_name'))
+
+# Function to load cache from database
+def load_cache_from_db():
+    """Loads coordinate cache from database (cache from old JSON file is imported on first run)"""
+    global cache_db
+    cache = {}
     
     try:
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            # Save cache to file in JSON format
-            json.dump(cache, f, ensure_ascii=False, indent=2)
-        print(f"Cache saved to file: {cache_file}")
-    except Exception as e:
-        print(f"Error saving cache to file: {e}")
+        cache_db = open_cache_db()
+        rows = cache_db.execute("SELECT lat, lon, city, state, country, display_name FROM loc").fetchall()
+        
+        # Import cache saved by previous versions
+        if not rows and os.path.exists(LEGACY_CACHE_FILE):
+            rows = [row for row in (cache_entry_to_row(key, location_info)
+                                    for key, location_info in load_cache_from_file().items()) if row]
+            with cache_db:
+                cache_db.executemany("INSERT OR REPLACE INTO loc VALUES (?, ?, ?, ?, ?, ?)", rows)
+            print(f"Imported {len(rows)} entries from {LEGACY_CACHE_FILE}")
+        
+        for lat, lon, city, state, country, display_name in rows:
+            cache[f"{lat / 1e6},{lon / 1e6}"] = {
+                'city': city,
+                'state': state,
+                'country': country,
+                'display_name': display_name
+            }
+    except sqlite3.Error as e:
+        print(f"Error loading cache from database: {e}")
+    
+    return cache
+
+# Function to save new cache entries to database
+def save_cache_to_db(cache):
+    """Saves cache entries added during this run to database"""
+    if cache_db is None or not unsaved_cache_keys:
+        return
+    
+    rows = [row for row in (cache_entry_to_row(key, cache[key]) for key in unsaved_cache_keys) if row]
+    try:
+        # Only new entries are written, existing ones are not rewritten
+        with cache_db:
+            cache_db.executemany("INSERT OR REPLACE INTO loc VALUES (?, ?, ?, ?, ?, ?)", rows)
+        unsaved_cache_keys.clear()
+        print(f"Saved {len(rows)} new entries to cache: {CACHE_DB_FILE}")
+    except sqlite3.Error as e:
+        print(f"Error saving cache to database: {e}")
 
 # Function to check if coordinates are close
-def are_coordinates_close(lat1, lon1, lat2, lon2, threshold=0.01):
+def are_coordinates_close(lat1, lon1, lat2, lon2, threshold=PROXIMITY_THRESHOLD):
     """Checks if coordinates are close enough to each other"""
     # Check if the difference between coordinates is less than the threshold
     # 0.01 degrees is approximately 1 km at the equator
     return abs(lat1 - lat2) < threshold and abs(lon1 - lon2) < threshold
 
+# Function to create cache key for coordinates
+def get_cache_key(latitude, longitude):
+    """Creates cache key from coordinates rounded to 6 decimal places"""
+    return f"{round(latitude, 6)},{round(longitude, 6)}"
+
+# Function to get coordinates from cache key
+def parse_cache_key(key):
+    """Splits cache key into (latitude, longitude), returns None for invalid keys"""
+    try:
+        latitude, longitude = map(float, key.split(','))
+        return latitude, longitude
+    except ValueError:
+        return None
+
+# Function to get grid cell of coordinates in cache index
+def get_cache_cell(latitude, longitude):
+    """Returns grid cell (PROXIMITY_THRESHOLD degrees in size) containing coordinates"""
+    return math.floor(latitude / PROXIMITY_THRESHOLD), math.floor(longitude / PROXIMITY_THRESHOLD)
+
+# Function to get grid cells that can contain coordinates close to given coordinates
+def get_neighbour_cells(latitude, longitude):
+    """Returns grid cell of coordinates and 8 neighbouring grid cells"""
+    cell_lat, cell_lon = get_cache_cell(latitude, longitude)
+    return [(neighbour_lat, neighbour_lon)
+            for neighbour_lat in (cell_lat - 1, cell_lat, cell_lat + 1)
+            for neighbour_lon in (cell_lon - 1, cell_lon, cell_lon + 1)]
+
+# Function to add cache entry to cache index
+def add_to_cache_index(key):
+    """Adds cached coordinates to cache index (invalid keys are skipped)"""
+    cached_coords = parse_cache_key(key)
+    if cached_coords is not None:
+        location_cache_index.setdefault(get_cache_cell(*cached_coords), []).append((*cached_coords, key))
+
+# Function to rebuild cache index
+def rebuild_cache_index():
+    """Builds cache index from all entries of location cache"""
+    location_cache_index.clear()
+    for key in location_cache:
+        add_to_cache_index(key)
+
+# Function to save location information to cache
+def add_to_cache(latitude, longitude, location_info):
+    """Saves location information for coordinates to cache and cache index (written to database later)"""
+    cache_key = get_cache_key(latitude, longitude)
+    if cache_key not in location_cache:
+        add_to_cache_index(cache_key)
+    location_cache[cache_key] = location_info
+    unsaved_cache_keys.append(cache_key)
+
 # Function to find close coordinates in cache
 def find_in_cache(latitude, longitude):
     """Searches for close coordinates in cache"""
@@ -59,73 +305,316 @@ def find_in_cache(latitude, longitude):
     lon_rounded = round(longitude, 6)
     
     # Check for exact match
-    cache_key = f"{lat_rounded},{lon_rounded}"
+    cache_key = get_cache_key(latitude, longitude)
     if cache_key in location_cache:
         return location_cache[cache_key]
     
     # If no exact match, look for close coordinates
-    for key in location_cache.keys():
-        try:
-            # Split key into coordinates
-            cached_lat, cached_lon = map(float, key.split(','))
-            
-            # Check if coordinates are close enough
-            if are_coordinates_close(lat_rounded, lon_rounded, cached_lat, cached_lon):
+    # Close coordinates can only be in the same or one of 8 neighbouring grid cells
+    # Bounds of close coordinates are computed once, so each cached point takes two chained comparisons
+    # (same check as are_coordinates_close)
+    lat_min, lat_max = lat_rounded - PROXIMITY_THRESHOLD, lat_rounded + PROXIMITY_THRESHOLD
+    lon_min, lon_max = lon_rounded - PROXIMITY_THRESHOLD, lon_rounded + PROXIMITY_THRESHOLD
+    for cell in get_neighbour_cells(lat_rounded, lon_rounded):
+        for cached_lat, cached_lon, key in location_cache_index.get(cell, ()):
+            if lat_min < cached_lat < lat_max and lon_min < cached_lon < lon_max:
                 return location_cache[key]
-        except Exception:
-            # Skip invalid keys
-            continue
     
     # If nothing found
     return None
 
 # Function to convert GPS coordinates from EXIF format to decimal degrees
-def convert_to_degrees(value):
-    """Converts GPS coordinates from EXIF format to decimal degrees"""
-    try:
-        d = float(value[0])
-        m = float(value[1])
-        s = float(value[2])
-        return d + (m / 60.0) + (s / 3600.0)
-    except (ValueError, ZeroDivisionError, TypeError, IndexError):
-        return None
+def convert_to_degrees(values, refs, negative_ref):
+    """Converts GPS coordinates of several photos from EXIF format to decimal degrees at once"""
+    # Degrees, minutes and seconds of each photo, NaN for photos without coordinates
+    # (values are read as one flat sequence, so each IFDRational is converted to float directly
+    # without building nested arrays of tuples)
+    dms = np.fromiter(itertools.chain.from_iterable(value if isinstance(value, tuple) else MISSING_DMS
+                                                    for value in values),
+                      dtype=np.float64, count=len(values) * 3).reshape(-1, 3)
+    degrees = dms[:, 0] + dms[:, 1] * (1 / 60) + dms[:, 2] * (1 / 3600)
+    
+    # Consider direction (S or W)
+    return np.where(np.asarray(refs, dtype=object) == negative_ref, -degrees, degrees)
+
+# Function to check GPS coordinate value from EXIF data
+def is_valid_dms(value):
+    """Checks that GPS coordinate consists of degrees, minutes and seconds numbers"""
+    return isinstance(value, tuple) and len(value) == 3 and all(isinstance(v, numbers.Real) for v in value)
 
 # Function to get GPS coordinates from EXIF data
-def get_gps_info(exif_data):
-    """Extracts GPS information from EXIF data"""
-    if not exif_data:
+def get_gps_info(gps_data):
+    """Extracts GPS coordinates (degrees, minutes, seconds) and their directions from GPS directory of EXIF data"""
+    if not gps_data:
         return None
     
-    gps_info = {}
-    
-    # Look for GPS data in EXIF
-    for key, value in exif_data.items():
-        tag_name = TAGS.get(key, key)
-        if tag_name == 'GPSInfo':
-            # Process GPS data
-            for gps_key in value:
-                sub_tag_name = GPSTAGS.get(gps_key, gps_key)
-                gps_info[sub_tag_name] = value[gps_key]
+    # Read GPS tags directly by their IDs:
+    # 1 is GPSLatitudeRef, 2 is GPSLatitude, 3 is GPSLongitudeRef, 4 is GPSLongitude
+    latitude = gps_data.get(2)
+    longitude = gps_data.get(4)
     
     # Check for necessary GPS data
-    if 'GPSLatitude' in gps_info and 'GPSLongitude' in gps_info:
-        lat = convert_to_degrees(gps_info['GPSLatitude'])
-        lon = convert_to_degrees(gps_info['GPSLongitude'])
+    if is_valid_dms(latitude) and is_valid_dms(longitude):
+        return {
+            'latitude': latitude,
+            'latitude_ref': gps_data.get(1, 'N'),
+            'longitude': longitude,
+            'longitude_ref': gps_data.get(3, 'E')
+        }
+    
+    return None
+
+# Function to pause between requests to Nominatim API
+def wait_for_request_slot():
+    """Waits until REQUEST_INTERVAL has passed since the previous request to Nominatim API"""
+    global last_request_time
+    # Requests are not paced (self-hosted server)
+    if REQUEST_INTERVAL <= 0:
+        return
+    
+    with request_lock:
+        if last_request_time is not None:
+            time.sleep(max(0.0, REQUEST_INTERVAL - (time.monotonic() - last_request_time)))
+        last_request_time = time.monotonic()
+
+# Function to extract location information from Nominatim API response
+def parse_location(data):
+    """Extracts city, state, country and display name from Nominatim API response"""
+    # Extract location information
+    location_info = {
+        'city': None,
+        'state': None,
+        'country': None,
+        'display_name': data.get('display_name')
+    }
+    
+    # Get detailed address information
+    address = data.get('address', {})
+    
+    # Try to get city (may be in different fields)
+    location_info['city'] = next((address[key] for key in CITY_KEYS if address.get(key)), None)
+    
+    # Get region/state
+    location_info['state'] = next((address[key] for key in STATE_KEYS if address.get(key)), None)
+    
+    # Get country
+    location_info['country'] = address.get('country')
+    
+    return location_info
+
+# Function to decode JSON response
+def parse_json_response(response):
+    """Decodes JSON body of HTTP response (with orjson if it is installed)"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+# Function to request location information from Nominatim API
+def fetch_location(latitude, longitude):
+    """Requests location information by GPS coordinates from Nominatim API (without caching)"""
+    # Form URL for Nominatim API request
+    url = f"{NOMINATIM_URL}?format=json&lat={latitude}&lon={longitude}&zoom=10&addressdetails=1"
+    
+    try:
+        # Send request
+        wait_for_request_slot()
+        response = session.get(url, timeout=10)
+        
+        # Check request success
+        if response.status_code == 200:
+            return parse_location(parse_json_response(response))
+        else:
+            print(f"Error in Nominatim API request: {response.status_code}")
+            return None
+    except Exception as e:
+        print(f"Error determining location: {e}")
+        return None
+
+# Function to request location information for one chunk of coordinates in a batch request
+def fetch_locations_batch_chunk(chunk):
+    """Requests location information for list of (latitude, longitude) pairs in a single Nominatim batch request,
+    returns None if server does not support batch requests"""
+    results = {}
+    
+    # Encode all coordinates of the chunk into a single request
+    payload = [{'lat': round(latitude, 6), 'lon': round(longitude, 6)} for latitude, longitude in chunk]
+    batch = quote(json.dumps(payload, separators=(',', ':')))
+    url = f"{NOMINATIM_URL}?format=json&batch={batch}&zoom=10&addressdetails=1"
+    
+    try:
+        wait_for_request_slot()
+        response = session.get(url, timeout=10)
+        
+        # Server does not support batch mode (e.g. public Nominatim instance)
+        if response.status_code == 400:
+            print("Batch requests are not supported by server, requesting coordinates one by one")
+            return None
+        
+        if response.status_code != 200:
+            print(f"Error in Nominatim API batch request: {response.status_code}")
+            return results
         
-        if lat is None or lon is None:
+        data = parse_json_response(response).get('batch')
+        if not isinstance(data, list) or len(data) != len(chunk):
+            print("Unexpected response to batch request, requesting coordinates one by one")
             return None
+        
+        # Results are returned in the same order as coordinates in request
+        for coords, item in zip(chunk, data):
+            if item and 'error' not in item:
+                results[coords] = parse_location(item)
+    except Exception as e:
+        print(f"Error determining location: {e}")
+    
+    return results
 
-        # Consider direction (N/S)
-        if gps_info.get('GPSLatitudeRef', 'N') == 'S':
-            lat = -lat
+# Function to pass received locations to callback
+def report_locations(results, on_result):
+    """Calls on_result(coords, location_info) for each received location (if on_result is set)"""
+    if on_result is not None:
+        for coords, location_info in results.items():
+            on_result(coords, location_info)
+
+# Function to cancel queued requests
+def cancel_requests(futures):
+    """Cancels requests that have not started yet, so executor does not send them when it is shut down"""
+    for future in futures:
+        future.cancel()
+
+# Function to request location information for several coordinates in batch requests
+def fetch_locations_batch(coordinates, on_result=None):
+    """Requests location information for list of (latitude, longitude) pairs using Nominatim batch mode,
+    on_result(coords, location_info) is called for each location as soon as it is received"""
+    global nominatim_batch_supported
+    chunks = [coordinates[start:start + BATCH_SIZE] for start in range(0, len(coordinates), BATCH_SIZE)]
+    if not chunks:
+        return {}
+    
+    # First request also checks whether server supports batch requests
+    print(f"Determining location for {len(coordinates)} coordinates in {len(chunks)} batch requests")
+    results = fetch_locations_batch_chunk(chunks[0])
+    if results is None:
+        nominatim_batch_supported = False
+        return {}
+    report_locations(results, on_result)
+    
+    # Other chunks are requested concurrently (paced by wait_for_request_slot())
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        futures = []
+        try:
+            for chunk in chunks[1:]:
+                futures.append(executor.submit(fetch_locations_batch_chunk, chunk))
+            # Results are taken as soon as each request completes
+            for future in as_completed(futures):
+                chunk_results = future.result()
+                if chunk_results is None:
+                    nominatim_batch_supported = False
+                else:
+                    results.update(chunk_results)
+                    report_locations(chunk_results, on_result)
+        except BaseException:
+            # On interruption (Ctrl+C) or error, requests not sent yet are dropped
+            cancel_requests(futures)
+            raise
+    
+    return results
+
+# Function to request location information for several coordinates from Azure Maps
+def fetch_locations_azure(coordinates, on_result=None):
+    """Requests location information for list of (latitude, longitude) pairs using Azure Maps batch requests,
+    on_result(coords, location_info) is called for each location as soon as it is received"""
+    results = {}
+    
+    for start in range(0, len(coordinates), AZURE_BATCH_SIZE):
+        chunk = coordinates[start:start + AZURE_BATCH_SIZE]
+        print(f"Determining location for {len(chunk)} coordinates in Azure Maps batch request "
+              f"({start + len(chunk)}/{len(coordinates)})")
+        
+        # Azure Maps expects coordinates as [longitude, latitude]
+        payload = {'batchItems': [{'coordinates': [longitude, latitude]} for latitude, longitude in chunk]}
+        
+        try:
+            response = session.post(AZURE_MAPS_URL, json=payload,
+                                    headers={'subscription-key': AZURE_MAPS_KEY}, timeout=30)
             
-        # Consider direction (E/W)
-        if gps_info.get('GPSLongitudeRef', 'E') == 'W':
-            lon = -lon
+            if response.status_code != 200:
+                print(f"Error in Azure Maps batch request: {response.status_code}")
+                continue
             
-        return {'latitude': lat, 'longitude': lon}
+            # Results are returned in the same order as coordinates in request
+            chunk_results = {}
+            for coords, item in zip(chunk, parse_json_response(response).get('batchItems', [])):
+                features = item.get('features')
+                if not features:
+                    continue
+                address = features[0].get('properties', {}).get('address', {})
+                admin_districts = address.get('adminDistricts') or [{}]
+                chunk_results[coords] = {
+                    'city': address.get('locality'),
+                    'state': admin_districts[0].get('name'),
+                    'country': address.get('countryRegion', {}).get('name'),
+                    'display_name': address.get('formattedAddress')
+                }
+            results.update(chunk_results)
+            report_locations(chunk_results, on_result)
+        except Exception as e:
+            print(f"Error determining location: {e}")
     
-    return None
+    return results
+
+# Function to show progress of long operations
+def iter_with_progress(items, total, description):
+    """Yields items, showing progress bar (tqdm) or printing progress every PROGRESS_INTERVAL items"""
+    if tqdm is not None:
+        yield from tqdm(items, total=total, desc=description)
+        return
+    for number, item in enumerate(items, start=1):
+        if number % PROGRESS_INTERVAL == 0 or number == total:
+            print(f"{description}: {number}/{total}")
+        yield item
+
+# Function to request location information for several coordinates concurrently
+def fetch_locations(coordinates, on_result=None):
+    """Requests location information for list of (latitude, longitude) pairs concurrently,
+    on_result(coords, location_info) is called for each location as soon as it is received"""
+    results = {}
+    
+    if GEOCODER == 'azure':
+        if AZURE_MAPS_KEY:
+            return fetch_locations_azure(coordinates, on_result)
+        print("Azure Maps key is not set, using Nominatim API")
+    
+    # Try to get all coordinates with a few batch requests first
+    if nominatim_batch_supported:
+        results = fetch_locations_batch(coordinates, on_result)
+        coordinates = [coords for coords in coordinates if coords not in results]
+        if not coordinates:
+            return results
+    
+    total = len(coordinates)
+    
+    # Requests are paced by wait_for_request_slot(), so waiting for a response
+    # overlaps with the pause before the next request
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        futures = {}
+        try:
+            for coords in coordinates:
+                futures[executor.submit(fetch_location, *coords)] = coords
+            
+            # Collect results of all requests as soon as each of them completes,
+            # so a slow request (e.g. retried after 429) does not hold back other results
+            for future in iter_with_progress(as_completed(futures), total, "Determining location"):
+                coords = futures[future]
+                results[coords] = future.result()
+                if on_result is not None:
+                    on_result(coords, results[coords])
+        except BaseException:
+            # On interruption (Ctrl+C) or error, requests not sent yet are dropped
+            # (received locations are already passed to on_result)
+            cancel_requests(futures)
+            raise
+    
+    return results
 
 # Function to determine city by GPS coordinates
 def get_location_info(latitude, longitude):
@@ -138,169 +627,382 @@ def get_location_info(latitude, longitude):
     if cached_result:
         return cached_result
     
-    # Round coordinates to 6 decimal places for caching
-    lat_rounded = round(latitude, 6)
-    lon_rounded = round(longitude, 6)
+    location_info = fetch_location(latitude, longitude)
     
-    # Create cache key
-    cache_key = f"{lat_rounded},{lon_rounded}"
+    # Save result to cache
+    if location_info:
+        add_to_cache(latitude, longitude, location_info)
     
-    # Form URL for Nominatim API request
-    url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={latitude}&lon={longitude}&zoom=10&addressdetails=1"
+    return location_info
+
+# Function to check file signature and read EXIF data of JPEG files
+def read_photo_header(file_path):
+    """Checks file signature of photo, returns (image_format, exif_segment): image_format is
+    'JPEG', 'PNG', 'TIFF' or None if file is not a supported image, exif_segment is EXIF data
+    of JPEG file (None if JPEG file has no EXIF data or file is not JPEG)"""
+    with open(file_path, 'rb') as f:
+        head = f.read(12)
+        
+        if head.startswith(JPEG_SIGNATURE):
+            # EXIF data in JPEG is stored in APP1 segment ("Exif" header) at the start of the file
+            head += f.read(65536 - len(head))
+            index = head.find(b'Exif\x00\x00')
+            while index != -1:
+                # APP1 marker and 2-byte segment length precede the header
+                if head[index - 4:index - 2] == b'\xff\xe1':
+                    # Segment length includes the 2 length bytes
+                    segment_end = index - 2 + int.from_bytes(head[index - 2:index], 'big')
+                    if segment_end > len(head):
+                        head += f.read(segment_end - len(head))
+                    return 'JPEG', head[index:segment_end]
+                index = head.find(b'Exif\x00\x00', index + 1)
+            return 'JPEG', None
+        
+        # EXIF data may be stored anywhere in PNG and TIFF files
+        if head.startswith(PNG_SIGNATURE):
+            return 'PNG', None
+        if head.startswith(TIFF_SIGNATURES):
+            return 'TIFF', None
     
-    # Add User-Agent to headers (Nominatim API requirement)
-    headers = {
-        'User-Agent': 'CityPin/1.0 (https://github.com/yourusername/citypin)'
-    }
+    return None, None
+
+# Function to get date taken and GPS information from EXIF data
+def get_exif_values(exif_data):
+    """Extracts (date_taken, gps_info) from EXIF data"""
+    # Extract date taken
+    # 36867 is DateTimeOriginal, stored in Exif directory (34665)
+    date_taken = exif_data.get_ifd(34665).get(36867)
+    # If DateTimeOriginal not found, try DateTime (306)
+    if not date_taken:
+        date_taken = exif_data.get(306)
+    
+    # Extract GPS information from GPS directory (34853) only
+    # (other directories, maker notes and thumbnails are never decoded)
+    gps_info = get_gps_info(exif_data.get_ifd(34853))
     
+    return date_taken, gps_info
+
+# Function to extract date and GPS coordinates from a single photo
+def extract_photo_data(file_path):
+    """Extracts date taken and GPS information from photo as (file_path, date_taken, gps_info),
+    returns None if file cannot be processed"""
     try:
-        # Send request
-        response = requests.get(url, headers=headers)
+        # Check file signature before reading the image
+        image_format, exif_segment = read_photo_header(file_path)
+        if image_format is None:
+            print(f"Error processing file {file_path}: not a supported image file")
+            return None
         
-        # Check request success
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Extract location information
-            location_info = {
-                'city': None,
-                'state': None,
-                'country': None,
-                'display_name': data.get('display_name')
-            }
-            
-            # Get detailed address information
-            address = data.get('address', {})
-            
-            # Try to get city (may be in different fields)
-            location_info['city'] = address.get('city') or address.get('town') or \
-                                   address.get('village') or address.get('hamlet') or \
-                                   address.get('municipality')
-            
-            # Get region/state
-            location_info['state'] = address.get('state') or address.get('region') or \
-                                    address.get('province') or address.get('county')
-            
-            # Get country
-            location_info['country'] = address.get('country')
+        if image_format == 'JPEG':
+            # Photo without EXIF data has neither date taken nor coordinates
+            if exif_segment is None:
+                return file_path, None, None
             
-            # Save result to cache
-            location_cache[cache_key] = location_info
-            
-            return location_info
+            # Parse EXIF segment already read from the file, the image itself is not opened
+            exif_data = Image.Exif()
+            exif_data.load(exif_segment)
+            date_taken, gps_info = get_exif_values(exif_data)
         else:
-            print(f"Error in Nominatim API request: {response.status_code}")
-            return None
+            # Open image with the plugin of its format only
+            with Image.open(file_path, formats=[image_format]) as img:
+                date_taken, gps_info = get_exif_values(img.getexif())
+        
+        # If GPS information not found, gps_info is None
+        return file_path, date_taken, gps_info
     except Exception as e:
-        print(f"Error determining location: {e}")
+        print(f"Error processing file {file_path}: {e}")
         return None
 
+# Function to find photo files in directory
+def iter_photo_files(directory):
+    """Recursively yields directory entries (os.DirEntry) of photo files with supported formats
+    in specified directory"""
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # Directory entries already know their type, so no extra stat call is needed
+                if entry.is_dir(follow_symlinks=False):
+                    yield from iter_photo_files(entry.path)
+                    continue
+                # Only the extension is lowercased and checked, not the whole file name
+                name = entry.name
+                if name[name.rfind('.'):].lower() in SUPPORTED_FORMATS and entry.is_file():
+                    yield entry
+    except OSError as e:
+        print(f"Error reading directory {directory}: {e}")
+
+# Function to find photo files changed since previous scan
+def iter_changed_photo_files(directory, scanned_files, file_stats):
+    """Yields paths of photo files in directory that are not in scanned_files (path -> (mtime_ns, size))
+    or were changed since they were scanned, (mtime_ns, size) of every photo file is saved to file_stats"""
+    for entry in iter_photo_files(directory):
+        try:
+            stat = entry.stat()
+        except OSError as e:
+            print(f"Error processing file {entry.path}: {e}")
+            continue
+        file_stats[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        if scanned_files.get(entry.path) != file_stats[entry.path]:
+            yield entry.path
+
+# Function to load results of previous scan
+def load_scan_cache(scan_cache_file):
+    """Loads photo data saved by previous scan from Parquet file, returns None if there is no saved data"""
+    if scan_cache_file is None or not os.path.exists(scan_cache_file):
+        return None
+    try:
+        scan_cache = pd.read_parquet(scan_cache_file, columns=SCAN_CACHE_COLUMNS) \
+            .drop_duplicates(subset=['file_path'], keep='last')
+        print(f"Loaded data of {len(scan_cache)} photos from scan cache.")
+        return scan_cache
+    except ImportError:
+        # Parquet engine (pyarrow) is not installed, all photos are read
+        pass
+    except Exception as e:
+        print(f"Warning: Could not read scan cache: {e}")
+    return None
+
+# Function to save results of scan
+def save_scan_cache(df, scan_cache_file):
+    """Saves photo data with size and modification time of files to Parquet file (requires pyarrow)"""
+    if scan_cache_file is None:
+        return
+    try:
+        df.to_parquet(scan_cache_file, index=False, compression=PARQUET_COMPRESSION)
+    except ImportError:
+        # Parquet engine (pyarrow) is not installed, photos will be read again on next run
+        pass
+    except Exception as e:
+        print(f"Warning: Could not save scan cache: {e}")
+
+# Function to extract data from photos in parallel
+def extract_photos_data(file_paths):
+    """Yields results of extract_photo_data for file paths in their order, reading photos in parallel"""
+    # Unlike executor.map, only a limited number of paths is taken from file_paths ahead,
+    # so the directory is still walked while first photos are read
+    with ThreadPoolExecutor(max_workers=MAX_SCAN_WORKERS) as executor:
+        pending = deque()
+        for file_path in file_paths:
+            pending.append(executor.submit(extract_photo_data, file_path))
+            if len(pending) >= MAX_PENDING_SCANS:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
 # Function to scan directory with photos
-def scan_photos_directory(directory):
-    """Scans specified directory and extracts GPS coordinates from photos"""
-    # Supported image formats
-    supported_formats = ('.jpg', '.jpeg', '.tiff', '.png')
-    
-    # Create list to store data
-    photo_data = []
-    
-    # Recursively traverse all files in specified directory
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.lower().endswith(supported_formats):
-                file_path = os.path.join(root, file)
-                try:
-                    # Open image
-                    with Image.open(file_path) as img:
-                        # Get EXIF data
-                        exif_data = img._getexif()
-                        
-                        # Extract date taken
-                        date_taken = None
-                        if exif_data:
-                            # 36867 is DateTimeOriginal
-                            date_taken = exif_data.get(36867)
-                            # If DateTimeOriginal not found, try DateTime (306)
-                            if not date_taken:
-                                date_taken = exif_data.get(306)
-
-                        # Extract GPS information
-                        gps_info = get_gps_info(exif_data)
-                        
-                        # If GPS information found, add to list
-                        if gps_info:
-                            photo_data.append({
-                                'file_path': file_path,
-                                'date_taken': date_taken,
-                                'latitude': gps_info['latitude'],
-                                'longitude': gps_info['longitude']
-                            })
-                        else:
-                            # If GPS information not found, add entry without coordinates
-                            photo_data.append({
-                                'file_path': file_path,
-                                'date_taken': date_taken,
-                                'latitude': None,
-                                'longitude': None
-                            })
-                except Exception as e:
-                    print(f"Error processing file {file_path}: {e}")
+def scan_photos_directory(directory, scan_cache_file=None):
+    """Scans specified directory and extracts GPS coordinates from photos
+    (photos not changed since they were saved to scan_cache_file are not read again)"""
+    # Size and modification time of photos from previous scan
+    scan_cache = load_scan_cache(scan_cache_file)
+    scanned_files = {}
+    if scan_cache is not None:
+        scanned_files = dict(zip(scan_cache['file_path'].tolist(),
+                                 zip(scan_cache['mtime_ns'].tolist(), scan_cache['size'].tolist())))
+    # (mtime_ns, size) of all photo files found, in order of directory walk
+    file_stats = {}
+    
+    # Collected data of new and changed photos, one list per column
+    file_paths = []
+    dates_taken = []
+    latitudes = []
+    latitude_refs = []
+    longitudes = []
+    longitude_refs = []
+    
+    # Read photos in parallel (reading EXIF is mostly waiting for disk)
+    for row in extract_photos_data(iter_changed_photo_files(directory, scanned_files, file_stats)):
+        if row is None:
+            continue
+        file_path, date_taken, gps_info = row
+        file_paths.append(file_path)
+        dates_taken.append(date_taken)
+        gps_info = gps_info or {}
+        latitudes.append(gps_info.get('latitude'))
+        latitude_refs.append(gps_info.get('latitude_ref'))
+        longitudes.append(gps_info.get('longitude'))
+        longitude_refs.append(gps_info.get('longitude_ref'))
+    
+    # Convert GPS coordinates of all photos to decimal degrees at once
+    latitudes = convert_to_degrees(latitudes, latitude_refs, 'S')
+    longitudes = convert_to_degrees(longitudes, longitude_refs, 'W')
+    
+    # Photo has coordinates only if both of them are valid
+    invalid = np.isnan(latitudes) | np.isnan(longitudes)
+    latitudes[invalid] = np.nan
+    longitudes[invalid] = np.nan
     
     # Create DataFrame from collected data
-    df = pd.DataFrame(photo_data)
-    return df
+    df = pd.DataFrame({
+        'file_path': file_paths,
+        'date_taken': dates_taken,
+        'latitude': latitudes,
+        'longitude': longitudes,
+        'mtime_ns': [file_stats[file_path][0] for file_path in file_paths],
+        'size': [file_stats[file_path][1] for file_path in file_paths]
+    })
+    
+    # Add photos not changed since previous scan, keeping order of directory walk
+    if scanned_files:
+        unchanged = scan_cache[[file_stats.get(file_path) == stats for file_path, stats in scanned_files.items()]]
+        if not unchanged.empty:
+            print(f"Skipped {len(unchanged)} photos not changed since previous scan.")
+            df = pd.concat([unchanged, df], ignore_index=True) if not df.empty else unchanged
+            order = {file_path: position for position, file_path in enumerate(file_stats)}
+            df = df.iloc[np.argsort(df['file_path'].map(order).to_numpy(), kind='stable')].reset_index(drop=True)
+    
+    # Photos of other directories stay in scan cache (results directory can be shared by several
+    # photo directories), only photos of scanned directory are replaced
+    cache_df = df
+    if scan_cache is not None:
+        other_photos = scan_cache[~scan_cache['file_path'].str.startswith(os.path.join(directory, ''))]
+        if not other_photos.empty:
+            cache_df = pd.concat([other_photos, df], ignore_index=True) if not df.empty else other_photos
+    save_scan_cache(cache_df, scan_cache_file)
+    return df.drop(columns=['mtime_ns', 'size'])
 
-# Function to add location information to photo data
-def add_location_info(photos_df):
-    """Adds location information to DataFrame with photo data"""
-    # Add new columns for location information
-    photos_df['city'] = None
-    photos_df['state'] = None
-    photos_df['country'] = None
-    photos_df['display_name'] = None
-    
-    # Counter for processed photos with coordinates
-    processed_count = 0
-    total_with_coords = photos_df['latitude'].notna().sum()
-    
-    # Process each row with coordinates
-    for index, row in photos_df[photos_df['latitude'].notna()].iterrows():
-        processed_count += 1
-        
-        # Get location information
-        location_info = get_location_info(row['latitude'], row['longitude'])
-        
-        # If information obtained, add it to DataFrame
+# Function to save received location to cache
+def add_received_location(coords, location_info):
+    """Saves location received from geocoder to cache, new cache entries are written to database
+    every CACHE_SAVE_INTERVAL entries (so they are kept even if program is killed before it ends)"""
+    if location_info:
+        add_to_cache(*coords, location_info)
+        if len(unsaved_cache_keys) >= CACHE_SAVE_INTERVAL:
+            save_cache_to_db(location_cache)
+
+# Function to determine location of coordinate groups using cache and Nominatim API
+def find_locations_online(group_coordinates):
+    """Determines location of each (key, latitude, longitude) group using cache and Nominatim API,
+    returns dictionary key -> location information"""
+    locations = {}
+    
+    # Take groups found in cache, collect coordinates of other groups that are not close
+    # to coordinates already queued for request
+    missing_groups = []
+    pending_coordinates = []
+    # Queued coordinates by grid cell (same grid as cache index), so only neighbouring cells are checked
+    pending_index = {}
+    for key, latitude, longitude in group_coordinates:
+        location_info = find_in_cache(latitude, longitude)
         if location_info:
-            photos_df.at[index, 'city'] = location_info['city']
-            photos_df.at[index, 'state'] = location_info['state']
-            photos_df.at[index, 'country'] = location_info['country']
-            photos_df.at[index, 'display_name'] = location_info['display_name']
-        
-        # Pause between requests to not exceed Nominatim API limit
-        # If data was retrieved from cache, no pause needed
-        if not find_in_cache(row['latitude'], row['longitude']):
-            print(f"Determining location for photo {processed_count}/{total_with_coords}: {row['file_path']}")
-            time.sleep(1)
+            locations[key] = location_info
+            continue
+        missing_groups.append((key, latitude, longitude))
+        if any(are_coordinates_close(latitude, longitude, pending_lat, pending_lon)
+               for cell in get_neighbour_cells(latitude, longitude)
+               for pending_lat, pending_lon in pending_index.get(cell, ())):
+            continue
+        pending_coordinates.append((latitude, longitude))
+        pending_index.setdefault(get_cache_cell(latitude, longitude), []).append((latitude, longitude))
+    
+    # Request missing locations and save them to cache
+    if pending_coordinates:
+        print(f"Requesting location for {len(pending_coordinates)} of {len(group_coordinates)} places")
+        fetch_locations(pending_coordinates, add_received_location)
+        save_cache_to_db(location_cache)
     
-    return photos_df
+    # Get location information of the missing groups from cache
+    for key, latitude, longitude in missing_groups:
+        locations[key] = find_in_cache(latitude, longitude)
+    
+    return locations
 
-# Function to create list of unique cities
-def create_unique_locations_list(photos_df):
-    """Creates list of unique locations without duplicates"""
-    # Create DataFrame with only location information (without file paths and coordinates)
-    locations_df = photos_df[['city', 'state', 'country']].copy()
+# Function to determine location of coordinate groups offline
+def find_locations_offline(group_coordinates):
+    """Determines location of each (key, latitude, longitude) group with reverse_geocoder package
+    (GeoNames cities, no requests), returns dictionary key -> location information"""
+    if not group_coordinates:
+        return {}
     
-    # Remove rows where city is not defined
-    locations_df = locations_df.dropna(subset=['city'])
+    # All coordinates are looked up at once in k-d tree of known cities
+    results = reverse_geocoder.search([(latitude, longitude) for _, latitude, longitude in group_coordinates],
+                                      mode=1, verbose=False)
     
-    # Remove duplicates
-    unique_locations_df = locations_df.drop_duplicates()
+    locations = {}
+    for (key, _, _), result in zip(group_coordinates, results):
+        # Country is returned as ISO code, detailed address is only available from Nominatim API
+        location_info = {
+            'city': result.get('name') or None,
+            'state': result.get('admin1') or None,
+            'country': result.get('cc') or None,
+            'display_name': None
+        }
+        location_info['display_name'] = ', '.join(
+            part for part in (location_info['city'], location_info['state'], location_info['country']) if part)
+        locations[key] = location_info
     
-    # Sort by country and city
-    unique_locations_df = unique_locations_df.sort_values(by=['country', 'state', 'city'])
+    return locations
+
+# Function to add location information to photo data
+def add_location_info(photos_df, has_coords=None):
+    """Adds location information to DataFrame with photo data (has_coords marks photos with coordinates)"""
+    if has_coords is None:
+        has_coords = photos_df['latitude'].notna()
+    
+    photos_with_coords = photos_df.loc[has_coords]
+    
+    # Group photos taken close to each other (~1 km grid), each group is looked up only once
+    # Key is integer number of grid cell (no string is created for each photo)
+    scale = 10 ** LOCATION_KEY_PRECISION
+    location_keys = (photos_with_coords['latitude'] * scale).round().astype(np.int64) * (360 * scale + 1) + \
+        (photos_with_coords['longitude'] * scale).round().astype(np.int64) + 180 * scale
+    group_photos = photos_with_coords[~location_keys.duplicated()]
+    group_coordinates = list(zip(location_keys[group_photos.index],
+                                 group_photos['latitude'], group_photos['longitude']))
+    
+    # Determine location of each group
+    if GEOCODER == 'offline' and reverse_geocoder is not None:
+        locations = find_locations_offline(group_coordinates)
+    else:
+        if GEOCODER == 'offline':
+            print("Package reverse_geocoder is not installed, using Nominatim API")
+        locations = find_locations_online(group_coordinates)
+    
+    # Add location information of each group to all its photos at once,
+    # photos without coordinates or location get empty values
+    locations_df = pd.DataFrame.from_dict(
+        {key: location_info for key, location_info in locations.items() if location_info},
+        orient='index', columns=LOCATION_COLUMNS)
+    location_values = locations_df.reindex(location_keys.to_numpy())
+    location_values.index = location_keys.index
+    return photos_df.assign(**location_values.reindex(photos_df.index).to_dict('series'))
+
+# Function to create list of unique cities
+def create_unique_locations_list(photos_df):
+    """Creates list of unique locations without duplicates with number of photos for each location"""
+    # Group photos with defined city by location in one pass (state and country may be empty),
+    # sorted by country and city
+    unique_locations_df = photos_df.dropna(subset=['city']) \
+        .groupby(['country', 'state', 'city'], dropna=False, sort=True) \
+        .size() \
+        .reset_index(name='n_photos')
     
-    return unique_locations_df
+    return unique_locations_df[['city', 'state', 'country', 'n_photos']]
+
+# Function to save DataFrame in Parquet format next to CSV file
+def save_parquet_copy(df, csv_file):
+    """Saves DataFrame to Parquet file with the same name as CSV file (requires pyarrow)"""
+    parquet_file = os.path.splitext(csv_file)[0] + '.parquet'
+    try:
+        df.to_parquet(parquet_file, index=False, compression=PARQUET_COMPRESSION)
+        print(f"Data saved to file: {parquet_file}")
+    except ImportError:
+        # Parquet engine (pyarrow) is not installed, only CSV file is saved
+        pass
+    except Exception as e:
+        print(f"Warning: Could not save Parquet file: {e}")
+
+# Function to save DataFrame to CSV file
+def save_csv(df, csv_file):
+    """Saves DataFrame to CSV file in UTF-8 (written by pyarrow if it is installed)"""
+    if pyarrow is not None:
+        try:
+            pyarrow.csv.write_csv(pyarrow.Table.from_pandas(df, preserve_index=False), csv_file)
+            return
+        except pyarrow.ArrowException:
+            # Columns pyarrow cannot convert (e.g. mixed types) are written by pandas
+            pass
+    df.to_csv(csv_file, index=False, encoding='utf-8')
 
 # Main program function
 def main():
@@ -315,10 +1017,15 @@ def main():
         print(f"Directory {photos_directory} does not exist!")
         return
 
-    # Load cache from file at program start
+    # Load cache from database at program start
     global location_cache
-    location_cache = load_cache_from_file()
+    location_cache = load_cache_from_db()
+    rebuild_cache_index()
     print(f"Loaded {len(location_cache)} entries from cache.")
+    
+    # Save new cache entries to database when program ends, including interruption (Ctrl+C) or error,
+    # so locations already received from Nominatim API are not requested again
+    atexit.register(save_cache_to_db, location_cache)
 
     # Check for previously processed files
     output_file = os.path.join(results_directory, 'photos_gps_data.csv')
@@ -333,8 +1040,9 @@ def main():
 
     print(f"Scanning directory {photos_directory}...")
     
-    # Scan directory and get data
-    photos_df = scan_photos_directory(photos_directory)
+    # Scan directory and get data (results are kept in scan cache, so unchanged photos are read only once)
+    scan_cache_file = os.path.join(results_directory, 'scan_cache.parquet')
+    photos_df = scan_photos_directory(photos_directory, scan_cache_file)
     
     # Display scanning results
     print(f"Found {len(photos_df)} photos.")
@@ -344,64 +1052,70 @@ def main():
     new_files_count = len(current_files - previous_files)
     print(f"New photos found: {new_files_count}")
 
-    print(f"Of these, {photos_df['latitude'].notna().sum()} have GPS coordinates.")
+    has_coords = photos_df['latitude'].notna()
+    coords_count = int(has_coords.sum())
+    print(f"Of these, {coords_count} have GPS coordinates.")
     
     # If there are photos with coordinates, determine location
-    if photos_df['latitude'].notna().sum() > 0:
+    if coords_count > 0:
         print("\nDetermining location by GPS coordinates...")
-        photos_df = add_location_info(photos_df)
+        photos_df = add_location_info(photos_df, has_coords)
         
         # Display statistics by cities
         cities = photos_df['city'].dropna().value_counts()
         print("\nCities found:")
         for city, count in cities.items():
             print(f"{city}: {count} photos")
-        
-        # Create list of unique locations
+    
+    # Merge with previous results (new data takes precedence for duplicate paths),
+    # so photos found by previous runs are counted in the list of unique locations too
+    if os.path.exists(output_file):
+        try:
+            df_old = pd.read_csv(output_file, encoding='utf-8')
+            # Keep old rows for files no longer in scan, add/update new rows
+            df_old_only = df_old[~df_old['file_path'].isin(photos_df['file_path'].astype(str))]
+            photos_df = pd.concat([df_old_only, photos_df], ignore_index=True)
+        except Exception as e:
+            print(f"Warning: Could not merge with previous results: {e}")
+    
+    if coords_count > 0:
+        # Create list of unique locations from photos of this and previous runs
         unique_locations = create_unique_locations_list(photos_df)
         
-        # Save list of unique locations to CSV file (merge with existing)
+        # Save list of unique locations to CSV file (merge with existing, locations without photos
+        # in results are kept, number of photos is taken from current results)
         unique_locations_file = os.path.join(results_directory, 'unique_locations.csv')
         if os.path.exists(unique_locations_file):
             try:
                 df_old_locs = pd.read_csv(unique_locations_file, encoding='utf-8')
                 unique_locations = pd.concat([df_old_locs, unique_locations], ignore_index=True) \
-                    .drop_duplicates(subset=['city', 'state', 'country']) \
+                    .drop_duplicates(subset=['city', 'state', 'country'], keep='last') \
                     .sort_values(by=['country', 'state', 'city'])
+                # Files from older versions have no number of photos
+                unique_locations['n_photos'] = unique_locations['n_photos'].astype('Int64')
             except Exception as e:
                 print(f"Warning: Could not read previous unique locations: {e}")
-        unique_locations.to_csv(unique_locations_file, index=False, encoding='utf-8')
+        save_csv(unique_locations, unique_locations_file)
         print(f"\nList of unique locations saved to file: {unique_locations_file}")
         
         # Display list of unique locations
         print("\nList of unique locations:")
-        for _, row in unique_locations.iterrows():
-            location_str = f"{row['city']}"
-            if row['state']:
-                location_str += f", {row['state']}"
-            if row['country']:
-                location_str += f", {row['country']}"
+        for city, state, country in unique_locations[['city', 'state', 'country']].itertuples(index=False, name=None):
+            location_str = f"{city}"
+            if pd.notna(state):
+                location_str += f", {state}"
+            if pd.notna(country):
+                location_str += f", {country}"
             print(location_str)
         
         # Display cache statistics
         print(f"\nCaching statistics:")
         print(f"Total unique coordinates in cache: {len(location_cache)}")
     
-    # Save results to CSV file (merge with existing, new data takes precedence for duplicate paths)
-    output_file = os.path.join(results_directory, 'photos_gps_data.csv')
-    if os.path.exists(output_file):
-        try:
-            df_old = pd.read_csv(output_file, encoding='utf-8')
-            # Keep old rows for files no longer in scan, add/update new rows
-            df_old_only = df_old[~df_old['file_path'].isin(photos_df['file_path'].astype(str))]
-            photos_df = pd.concat([df_old_only, photos_df], ignore_index=True)
-        except Exception as e:
-            print(f"Warning: Could not merge with previous results: {e}")
-    photos_df.to_csv(output_file, index=False, encoding='utf-8')
+    # Save results to CSV file
+    save_csv(photos_df, output_file)
     print(f"\nData saved to file: {output_file}")
- 
-    # Save cache to file when program ends
-    save_cache_to_file(location_cache)
+    save_parquet_copy(photos_df, output_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file